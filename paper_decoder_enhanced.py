@@ -1,13 +1,59 @@
 import os
+import argparse
+import asyncio
+import contextlib
+import contextvars
+import functools
+import hashlib
+import logging
+import random
+import re
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+import httpx
 import openai
 import json
-import requests
-from typing import List, Dict, Any, Optional
+from pathlib import Path
+from typing import List, Dict, AsyncIterator
 
 os.environ["OPENAI_API_KEY"] = "YOUR_API_KEY"
-client = openai.OpenAI()
+
+# Progress messages go to stderr through logging, so they never land inside streamed output on stdout
+logger = logging.getLogger(__name__)
+
+# Client of the run in progress. Pooled connections belong to the event loop that opened them,
+# so each run creates its own client and closes it before that loop ends
+_current_client = contextvars.ContextVar("openai_client", default=None)
+
+@contextlib.asynccontextmanager
+async def _openai_client():
+    """
+    Yield the pooled client of the run in progress, or a new one that is closed when the block exits.
+    Entry points open the client once, so every request of a run shares its connections.
+    """
+    client = _current_client.get()
+    if client is not None:
+        yield client
+        return
+    
+    # One pooled HTTP/2 client per run, so concurrent requests share connections
+    # instead of paying a TCP/TLS handshake each
+    http_client = openai.DefaultAsyncHttpxClient(
+        http2=True,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=50)
+    )
+    # Transient API errors are retried by _retry_transient_errors, so the SDK's own retries are disabled
+    async with openai.AsyncOpenAI(http_client=http_client, max_retries=0) as client:
+        token = _current_client.set(client)
+        try:
+            yield client
+        finally:
+            _current_client.reset(token)
 
 import pdfplumber
+import diskcache
+import tiktoken
+import tenacity
 
 # Tool definitions
 DEEP_WIKI_MCP_TOOL = {
@@ -27,34 +73,238 @@ WEB_SEARCH_TOOL = {
     "type": "web_search"
 }
 
+# Tool lists for every (use_deepwiki, use_web_search) combination, built once
+_TOOLS = {
+    (False, False): None,
+    (True, False): (DEEP_WIKI_MCP_TOOL,),
+    (False, True): (WEB_SEARCH_TOOL,),
+    (True, True): (DEEP_WIKI_MCP_TOOL, WEB_SEARCH_TOOL),
+}
+
+# Stable system instructions shared by every request. OpenAI caches identical prompt
+# prefixes of 1024+ tokens, so this block is kept long, constant and always sent first;
+# the per-request content (chunk, term) goes last in the user message.
+SYSTEM_GUIDE = """
+You are Paper Decoder, an assistant that helps non-experts understand academic research papers.
+You receive short excerpts (chunks) of a paper that was extracted from a PDF, or individual technical
+terms taken from such a paper, together with a specific task. Follow the task exactly; the guidance
+below applies to every task unless the task says otherwise.
+
+AUDIENCE
+- Write for a curious, educated reader who is not a specialist in the paper's field: think of a
+  software engineer reading a machine learning paper, or a product manager reading a systems paper.
+- Assume familiarity with everyday technology and high-school mathematics, but not with field-specific
+  jargon, notation, or the names of particular models, datasets, benchmarks, or algorithms.
+- Prefer plain words over jargon. When a technical term is unavoidable, define it the first time it
+  appears, in one short clause, and then use it consistently.
+- Use concrete analogies and small examples where they genuinely help, but never at the cost of accuracy.
+
+ACCURACY
+- Stay faithful to the text you are given. Do not invent results, numbers, authors, datasets, or
+  claims that are not in the excerpt or in the sources you retrieve.
+- If the excerpt is truncated, garbled by PDF extraction (broken words, stray page numbers, running
+  headers, reference lists, table fragments), or too short to support a conclusion, work with what is
+  there and say briefly what is missing rather than guessing.
+- Distinguish clearly between what the paper claims, what it demonstrates experimentally, and what is
+  general background knowledge.
+- Keep numbers, units, and model names exactly as they appear in the source.
+
+TOOLS
+- Web search: use it to confirm the meaning of technical terms, acronyms, and named methods, and to add
+  current context that a non-expert would need. Prefer authoritative sources such as official
+  documentation, the original papers, university course material, and well-known reference sites.
+  Do not use web search for facts that are already stated in the excerpt.
+- DeepWiki: use it to look up GitHub repositories that implement the methods described, provide
+  related research code, or host the tools, libraries, datasets, and benchmarks the text mentions.
+  Only recommend repositories that actually exist and that you can connect to the text; for each one,
+  say in a sentence why it is relevant.
+- Use tools only when they improve the answer, and never let tool output override what the paper
+  itself says about its own methods and results.
+
+TECHNICAL TERMS
+- A technical term is a word or phrase whose meaning a non-expert could not reliably infer: named
+  methods and architectures, field-specific concepts, acronyms, metrics, and mathematical objects.
+- Do not list ordinary words, generic phrases ("results", "approach", "performance"), author names,
+  section headings, or citation markers.
+- Consolidate variants of the same concept into one canonical term, for example "LLMs", "large
+  language models", and "large language model" become "large language models".
+- Order terms by how important they are for understanding the excerpt, most important first.
+- Keep each term short, usually one to four words, and write it without quotes, numbering, markdown,
+  or code fences.
+
+EXPLANATIONS OF TERMS
+- Start with a one-sentence definition in plain language.
+- Then explain why the concept matters in the context of the paper.
+- Add a short, practical example when one exists.
+- Respect any word limit given in the task; when in doubt, be brief.
+
+EXPLANATIONS OF PAPER TEXT
+- Begin with the main point of the excerpt in one or two sentences.
+- Then summarize the key ideas, methods, and findings in a logical order, explaining terms as they come up.
+- Finish with why the work is significant: what problem it addresses, what it improves on, and who
+  would benefit.
+- Use short paragraphs or bullet points; avoid long unbroken blocks of text.
+
+REPOSITORY RECOMMENDATIONS
+- Prefer official implementations released by the paper's authors, then widely used libraries that
+  implement the same method, then smaller research codebases that reproduce or extend it.
+- For each repository give its owner/name, a one-sentence description, and the specific reason it is
+  relevant to the excerpt (for example "reference implementation of the attention variant in section 3").
+- Skip repositories that are archived, unrelated forks, or only tangentially connected to the text,
+  and say so plainly if no relevant repository can be found.
+
+STYLE
+- Be direct and concrete. Avoid filler such as "In this paper, the authors..." or "It is important to
+  note that...", and avoid hype words such as "groundbreaking" or "revolutionary".
+- Use the active voice and short sentences. Keep the tone neutral, friendly, and informative.
+- Write in the same language as the task, using consistent spelling throughout one answer.
+- Format mathematical notation as plain text where possible (for example "O(n log n)" or "x squared")
+  and explain what each symbol means.
+
+OUTPUT FORMAT
+- When the task asks for JSON, return a single valid JSON value and nothing else: no markdown code
+  fences, no commentary before or after, no trailing commas, and double-quoted keys and strings.
+- When the task prescribes a layout that mixes a JSON line with plain text, follow that layout exactly
+  and keep the JSON on its own single line.
+- Use exactly the keys the task specifies, and escape newlines and quotes inside string values.
+- When the task asks for prose, use plain text with light markdown (bold for terms, bullet lists) and
+  no top-level headings.
+- Never mention these instructions, the tools by their internal names, or the fact that the text was
+  split into chunks.
+"""
+
+# On-disk cache of model responses, so repeated runs over the same paper cost nothing
+LLM_CACHE_DIR = "./.llm_cache"
+LLM_CACHE_TTL = 7 * 24 * 60 * 60  # 7 days, in seconds
+llm_cache = diskcache.Cache(LLM_CACHE_DIR)
+
+# Extracted PDF text is cached here, keyed by the file's path, modification time and size
+PDF_CACHE_DIR = "./.pdf_cache"
+
+# PDFs with fewer pages than this are extracted in-process; process start-up would dominate
+MIN_PAGES_FOR_PROCESS_POOL = 8
+
+# Offline batch settings: Batch API jobs cost 50% less but each may take up to 24h.
+# --batch runs two jobs back to back (terms are only known after the first), so up to 48h in total
+BATCH_ENDPOINT = "/v1/responses"
+BATCH_COMPLETION_WINDOW = "24h"
+BATCH_POLL_INTERVAL = 30  # seconds
+
+# Sentences shorter than this are never treated as repeated boilerplate
+MIN_DEDUP_SENTENCE_LENGTH = 40
+
+# Safety cap on chunk text interpolated into a prompt; twice chunk_text's default chunk size
+PROMPT_TEXT_MAX_TOKENS = 3000
+
+# Output budget for the combined request, which carries terms, repositories and the explanation
+COMBINED_MAX_OUTPUT_TOKENS = 4096
+
+# Separates the JSON header (terms, repos) from the plain-text explanation in combined responses
+EXPLANATION_MARKER = "===EXPLANATION==="
+
+# Retry policy for a single API call that hits a rate limit, connection error or 5xx
+API_MAX_ATTEMPTS = 6
+
+# Retry policy for a chunk whose reply can't be parsed (ValueError), with exponential backoff starting
+# at CHUNK_RETRY_BASE_DELAY seconds. Transient API errors are already retried per call, and other
+# errors (bad request, authentication, bugs) would fail the same way again, so neither is retried here
+CHUNK_MAX_ATTEMPTS = 2
+CHUNK_RETRY_BASE_DELAY = 2
+
 def extract_text_from_pdf(file_path):
-    """Extract text from PDF file"""
-    text = ""
-    with pdfplumber.open(file_path) as pdf:
-        for page in pdf.pages:
-            text += page.extract_text() + "\n"
+    """Extract text from PDF file, reusing a cached copy if the file hasn't changed"""
+    return _extract_text_cached(
+        os.path.abspath(file_path), os.path.getmtime(file_path), os.path.getsize(file_path)
+    )
+
+@functools.lru_cache(maxsize=32)
+def _extract_text_cached(path, mtime, size):
+    key = hashlib.sha1(f"{path}:{mtime}:{size}".encode()).hexdigest()
+    cache_file = Path(PDF_CACHE_DIR) / f"{key}.txt"
+    if cache_file.exists():
+        return cache_file.read_text(encoding="utf-8")
+    
+    text = _extract_text_uncached(path)
+    cache_file.parent.mkdir(parents=True, exist_ok=True)
+    # Write to a temporary file and rename it into place, so an interrupted write can't leave
+    # a truncated cache entry behind under a key that never changes
+    tmp_file = cache_file.with_suffix(f".{os.getpid()}.tmp")
+    try:
+        tmp_file.write_text(text, encoding="utf-8")
+        os.replace(tmp_file, cache_file)
+    finally:
+        tmp_file.unlink(missing_ok=True)
     return text
 
-def chunk_text(text, max_length=3000):
-    """Split text into manageable chunks"""
-    words = text.split()
-    chunks = []
-    chunk = []
+def _extract_range(args):
+    """Extract pages [lo, hi) (0-based) of a PDF; runs in a worker process"""
+    path, lo, hi = args
+    # pdfplumber page numbers are 1-based
+    with pdfplumber.open(path, pages=range(lo + 1, hi + 1)) as pdf:
+        return "\n".join(page.extract_text() or "" for page in pdf.pages)
 
-    for word in words:
-        chunk.append(word)
-        if len(' '.join(chunk)) > max_length:
-            chunks.append(' '.join(chunk))
-            chunk = []
-    if chunk:
-        chunks.append(' '.join(chunk))
-    return chunks
+def _extract_text_uncached(file_path):
+    # pdfminer parsing is CPU-bound and holds the GIL, so split pages across processes
+    with pdfplumber.open(file_path) as pdf:
+        page_count = len(pdf.pages)
+    
+    workers = min(os.cpu_count() or 1, page_count)
+    if workers <= 1 or page_count < MIN_PAGES_FOR_PROCESS_POOL:
+        return _extract_range((file_path, 0, page_count))
+    
+    step = -(-page_count // workers)  # ceil division
+    ranges = [(file_path, lo, min(lo + step, page_count)) for lo in range(0, page_count, step)]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        parts = list(executor.map(_extract_range, ranges))
+    return "\n".join(parts)
+
+@functools.lru_cache(maxsize=None)
+def _token_encoding(model):
+    return tiktoken.encoding_for_model(model)
+
+def chunk_text(text, max_tokens=1500, model="gpt-4o"):
+    """
+    Split text into chunks of at most max_tokens tokens for the given model.
+    The default leaves room for the prompt instructions and the model's output.
+    """
+    encoding = _token_encoding(model)
+    # Papers about language models may quote special tokens such as <|endoftext|>; encode them as plain text
+    tokens = encoding.encode(text, disallowed_special=())
+    return [encoding.decode(tokens[i:i + max_tokens]) for i in range(0, len(tokens), max_tokens)]
 
-def call_openai_with_tools(prompt, model="gpt-4o", use_deepwiki=False, use_web_search=False):
+def compress_for_llm(chunk, max_tokens=PROMPT_TEXT_MAX_TOKENS, model="gpt-4o"):
     """
-    Call OpenAI API with DeepWiki MCP and/or web search tools
+    Shrink a chunk before it is interpolated into a prompt: drop repeated sentences
+    (running headers, boilerplate), then cap the text at max_tokens as a safety net.
+    The cap is well above chunk_text's chunk size, so a normal chunk is never cut.
     """
+    seen = set()
+    kept = []
+    # The capturing group keeps each sentence's trailing whitespace, so paragraph breaks survive
+    parts = re.split(r'(?<=[.!?])(\s+)', chunk)
+    for sentence, whitespace in zip(parts[::2], parts[1::2] + [""]):
+        if len(sentence) >= MIN_DEDUP_SENTENCE_LENGTH:
+            digest = zlib.crc32(' '.join(sentence.lower().split()).encode())
+            if digest in seen:
+                continue
+            seen.add(digest)
+        kept.append(sentence + whitespace)
+    chunk = ''.join(kept)
+    
+    encoding = _token_encoding(model)
+    tokens = encoding.encode(chunk, disallowed_special=())
+    if len(tokens) > max_tokens:
+        chunk = encoding.decode(tokens[:max_tokens])
+    return chunk
+
+def build_request_params(prompt, model="gpt-4o", use_deepwiki=False, use_web_search=False, text_format="text",
+                         max_output_tokens=2048):
+    """Build the Responses API parameters for a prompt and the requested tools"""
     input_messages = [
+        {
+            "role": "system",
+            "content": SYSTEM_GUIDE
+        },
         {
             "role": "user",
             "content": prompt
@@ -63,41 +313,151 @@ def call_openai_with_tools(prompt, model="gpt-4o", use_deepwiki=False, use_web_s
     params = {
         "model": model,
         "input": input_messages,
-        "text": {"format": {"type": "text"}},
+        "text": {"format": {"type": text_format}},
         "reasoning": {},
         "temperature": 0.3,
-        "max_output_tokens": 2048,
+        "max_output_tokens": max_output_tokens,
         "top_p": 1,
         "store": True
     }
     
-    tools = []
-    if use_deepwiki:
-        tools.append(DEEP_WIKI_MCP_TOOL)
-    if use_web_search:
-        tools.append(WEB_SEARCH_TOOL)
-    
+    tools = _TOOLS[(bool(use_deepwiki), bool(use_web_search))]
     if tools:
         params["tools"] = tools
+    return params
+
+# Retries a coroutine function on rate limits, connection errors and 5xx responses.
+# A timed-out request may still have been processed, so only use this where a duplicate is harmless:
+# reads, or a model call whose repeat merely costs tokens (not uploads or batch jobs)
+_retry_transient_errors = tenacity.retry(
+    wait=tenacity.wait_random_exponential(min=1, max=60),
+    stop=tenacity.stop_after_attempt(API_MAX_ATTEMPTS),
+    retry=tenacity.retry_if_exception_type(
+        (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError)
+    ),
+    reraise=True
+)
+
+def _response_cache_key(prompt, params):
+    return hashlib.sha256(json.dumps({
+        "model": params["model"],
+        "system": hashlib.sha256(SYSTEM_GUIDE.encode()).hexdigest(),
+        "prompt": prompt,
+        "tools": sorted(t["type"] for t in params.get("tools", ())),
+        "temp": params["temperature"],
+        "format": params["text"]["format"]["type"]
+    }, sort_keys=True).encode()).hexdigest()
+
+def _is_valid(validate, text):
+    try:
+        validate(text)
+    except ValueError:  # includes json.JSONDecodeError
+        return False
+    return True
+
+@_retry_transient_errors
+async def _create_response(params):
+    async with _openai_client() as client:
+        return await client.responses.create(**params)
+
+@_retry_transient_errors
+async def _create_response_stream(client, params):
+    # Only opening the stream is retried: once events flow, a retry would repeat consumed text
+    return await client.responses.create(**params, stream=True)
+
+async def call_openai_with_tools(prompt, model="gpt-4o", use_deepwiki=False, use_web_search=False, text_format="text",
+                                max_output_tokens=2048, validate=None):
+    """
+    Call OpenAI API with DeepWiki MCP and/or web search tools.
+    Pass text_format="json_object" to force a JSON response.
+    Responses are cached on disk by (model, prompt, tools, temperature, format), but only when the
+    response completed and validate(text) doesn't raise; validate defaults to json.loads for JSON output.
+    Raises validate's ValueError (json.JSONDecodeError by default) if a completed response fails validation.
+    """
+    if validate is None and text_format == "json_object":
+        validate = json.loads
+    params = build_request_params(prompt, model, use_deepwiki, use_web_search, text_format, max_output_tokens)
+    cache_key = _response_cache_key(prompt, params)
+    cached = llm_cache.get(cache_key)
+    if cached is not None:
+        if validate is None or _is_valid(validate, cached):
+            return cached
+        llm_cache.delete(cache_key)
     
-    print('DEBUG: About to call OpenAI responses API')
-    response = client.responses.create(**params)
-    print('DEBUG: Finished OpenAI responses API call')
+    logger.debug('About to call OpenAI responses API')
+    response = await _create_response(params)
+    logger.debug('Finished OpenAI responses API call')
     
-    # Extract the text from the output field
-    try:
-        if hasattr(response, 'output') and response.output:
-            for output_item in response.output:
-                if hasattr(output_item, 'content') and output_item.content:
-                    for content_item in output_item.content:
-                        if hasattr(content_item, 'text') and content_item.text:
-                            return content_item.text
+    # output_text aggregates every text part of the response's output messages
+    text = getattr(response, "output_text", None)
+    if not text:
         return "[No output from model]"
-    except Exception as e:
-        return f"Response error: {str(e)}"
+    # Truncated (status "incomplete") or unparseable replies are returned but never cached,
+    # so a retry asks the model again instead of replaying the bad reply
+    if getattr(response, "status", None) == "completed":
+        if validate is not None:
+            validate(text)
+        llm_cache.set(cache_key, text, expire=LLM_CACHE_TTL)
+    return text
 
-def identify_technical_terms(chunk):
-    """Identify technical terms that need explanation using web search"""
+async def call_openai_with_tools_streaming(prompt, model="gpt-4o", use_deepwiki=False, use_web_search=False, text_format="text",
+                                          max_output_tokens=2048, validate=None) -> AsyncIterator[str]:
+    """
+    Streaming variant of call_openai_with_tools: yields text deltas as the model produces them.
+    Opening the stream is retried on transient errors; a cache hit is yielded in one piece.
+    The full text is cached under the same key as call_openai_with_tools, on the same conditions.
+    """
+    params = build_request_params(prompt, model, use_deepwiki, use_web_search, text_format, max_output_tokens)
+    cache_key = _response_cache_key(prompt, params)
+    cached = llm_cache.get(cache_key)
+    if cached is not None:
+        if validate is None or _is_valid(validate, cached):
+            yield cached
+            return
+        llm_cache.delete(cache_key)
+    
+    parts = []
+    status = None
+    async with _openai_client() as client:
+        stream = await _create_response_stream(client, params)
+        async for event in stream:
+            if event.type == "response.output_text.delta":
+                parts.append(event.delta)
+                yield event.delta
+            elif event.type in ("response.completed", "response.incomplete", "response.failed"):
+                status = event.response.status
+    
+    text = "".join(parts)
+    if text and status == "completed" and (validate is None or _is_valid(validate, text)):
+        llm_cache.set(cache_key, text, expire=LLM_CACHE_TTL)
+
+def clean_technical_terms(terms):
+    """Strip JSON artifacts from model-returned terms and merge near-duplicates"""
+    # Filter out JSON artifacts and clean terms
+    cleaned_terms = []
+    for term in terms:
+        if term and isinstance(term, str):
+            # Remove JSON formatting artifacts
+            clean_term = term.replace('```json', '').replace('```', '').strip()
+            if clean_term and len(clean_term) > 2 and not clean_term.startswith('```'):
+                cleaned_terms.append(clean_term)
+    
+    # Deduplicate similar terms: terms made of the same words (ignoring case, order and
+    # punctuation) share a key, and the longer/more specific spelling is kept
+    canonical = {}
+    for term in cleaned_terms:
+        key = frozenset(token.lower() for token in re.findall(r"\w+", term))
+        if key not in canonical or len(term) > len(canonical[key]):
+            canonical[key] = term
+    
+    return list(canonical.values())[:8]  # Limit to 8 most important terms
+
+async def identify_technical_terms(chunk):
+    """
+    Identify technical terms that need explanation using web search.
+    Standalone helper: the pipeline gets terms from decode_chunk_combined instead.
+    Raises ValueError if the model's reply is not a JSON object with a "terms" list.
+    """
     prompt = f"""
     Extract unique technical terms, concepts, and jargon from this research paper text that a non-expert might not understand.
     
@@ -105,72 +465,74 @@ def identify_technical_terms(chunk):
     1. Group similar concepts together (e.g., "agentic systems", "agentic AI systems", "agentic artificial intelligence" should be consolidated as "agentic systems")
     2. Avoid JSON formatting artifacts like "```json" or "```"
     3. Focus on distinct, meaningful technical concepts
-    4. Return ONLY a JSON array of strings with the technical terms, nothing else.
+    4. Return ONLY a JSON object with a "terms" array of strings, nothing else.
     
-    Example format: ["term1", "term2", "term3"]
+    Example format: {{"terms": ["term1", "term2", "term3"]}}
     
-    Text: {chunk}
+    Text: {compress_for_llm(chunk)}
     """
-    response = call_openai_with_tools(prompt, use_web_search=True)
+    response = await call_openai_with_tools(prompt, use_web_search=True, text_format="json_object")
     
-    # Parse JSON response
-    try:
-        response_str = response.strip()
-        if response_str.startswith('[') and response_str.endswith(']'):
-            terms = json.loads(response_str)
-            if isinstance(terms, list):
-                # Filter out JSON artifacts and clean terms
-                cleaned_terms = []
-                for term in terms:
-                    if term and isinstance(term, str):
-                        # Remove JSON formatting artifacts
-                        clean_term = term.replace('```json', '').replace('```', '').strip()
-                        if clean_term and len(clean_term) > 2 and not clean_term.startswith('```'):
-                            cleaned_terms.append(clean_term)
-                
-                # Deduplicate similar terms
-                deduplicated_terms = []
-                for term in cleaned_terms:
-                    # Check if this term is too similar to existing ones
-                    is_duplicate = False
-                    for existing_term in deduplicated_terms:
-                        # Simple similarity check - if one term contains the other, keep the more specific one
-                        if term.lower() in existing_term.lower() or existing_term.lower() in term.lower():
-                            # Keep the longer/more specific term
-                            if len(term) > len(existing_term):
-                                deduplicated_terms.remove(existing_term)
-                                deduplicated_terms.append(term)
-                            is_duplicate = True
-                            break
-                    
-                    if not is_duplicate:
-                        deduplicated_terms.append(term)
-                
-                return deduplicated_terms[:8]  # Limit to 8 most important terms
-    except Exception:
-        pass
-    
-    # Fallback: extract terms from text
-    import re
-    lines = response.split('\n')
-    terms = [line.strip().strip('-*•').strip() for line in lines if line.strip() and len(line.strip()) > 2]
-    return terms[:8]
-
-def explain_technical_term_with_web_search(term):
-    """Explain a technical term using web search"""
-    prompt = f"""
-    Search the web for information about '{term}' and provide a clear, concise explanation suitable for a non-expert audience.
-    Focus on:
+    # json_object output is enforced; a malformed or empty reply raises json.JSONDecodeError (a ValueError)
+    result = json.loads(response)
+    terms = result.get("terms") if isinstance(result, dict) else None
+    if not isinstance(terms, list):
+        raise ValueError(f"Term response has no \"terms\" list: {response[:200]!r}")
+    return clean_technical_terms(terms)
+
+def batched_terms_prompt(terms):
+    """Prompt asking for explanations of several technical terms as one JSON object"""
+    return f"""
+    Search the web as needed and, for each term in the list below, provide a clear, concise explanation
+    suitable for a non-expert audience. Each explanation should cover:
     1. A simple definition
     2. Why it's important in the context
     3. A practical example if applicable
     
-    Keep the explanation under 100 words.
+    Keep each explanation under 100 words.
+    Return ONLY a JSON object mapping each term, exactly as written, to its explanation:
+    {{"term": "explanation_under_100_words"}}
+    
+    Terms: {json.dumps(terms)}
     """
-    return call_openai_with_tools(prompt, use_web_search=True)
 
-def find_relevant_repositories(chunk):
-    """Find relevant repositories using DeepWiki based on the research paper content"""
+def parse_batched_terms_response(terms, response):
+    """Map each term to its explanation from a batched_terms_prompt response"""
+    try:
+        result = json.loads(response)
+    except json.JSONDecodeError:
+        result = {}
+    if not isinstance(result, dict):
+        result = {}
+    
+    # Match case-insensitively in case the model normalised the term's spelling
+    by_lower = {str(key).lower(): value for key, value in result.items()}
+    return {
+        term: str(result.get(term) or by_lower.get(term.lower()) or "[No explanation returned]")
+        for term in terms
+    }
+
+async def explain_terms_batched(terms):
+    """
+    Explain several technical terms in a single request, sharing one prompt and round trip.
+    A malformed reply is not cached; its terms get the "[No explanation returned]" placeholder.
+    """
+    if not terms:
+        return {}
+    try:
+        response = await call_openai_with_tools(
+            batched_terms_prompt(terms), use_web_search=True, text_format="json_object"
+        )
+    except ValueError as e:
+        logger.debug('Malformed term explanations (%s); using placeholders', e)
+        response = ""
+    return parse_batched_terms_response(terms, response)
+
+async def find_relevant_repositories(chunk):
+    """
+    Find relevant repositories using DeepWiki based on the research paper content.
+    Standalone helper: the pipeline gets repositories from decode_chunk_combined instead.
+    """
     prompt = f"""
     Based on this research paper text, identify relevant GitHub repositories that might be related to the topics, 
     technologies, or methods discussed. Use DeepWiki to search for repositories that could be useful for:
@@ -179,17 +541,15 @@ def find_relevant_repositories(chunk):
     3. Tools and libraries mentioned
     4. Datasets or benchmarks referenced
     
-    Research paper text: {chunk[:1000]}  # Use first 1000 chars for repository search
-    
     Provide a list of relevant repositories with brief descriptions of why they're relevant.
+    
+    Research paper text: {chunk[:1000]}
     """
-    return call_openai_with_tools(prompt, use_deepwiki=True)
+    return await call_openai_with_tools(prompt, use_deepwiki=True)
 
-def explain_paper_with_enhanced_tools(chunk):
-    """
-    Explain a research paper chunk using web search for technical terms and DeepWiki for repositories
-    """
-    prompt = f"""
+def paper_explanation_prompt(chunk):
+    """Prompt asking for an accessible explanation of a research paper chunk"""
+    return f"""
     Explain this research paper text in a clear, accessible way. When you encounter technical terms, 
     jargon, or complex concepts, use web search to provide accurate, detailed explanations.
     
@@ -199,73 +559,424 @@ def explain_paper_with_enhanced_tools(chunk):
     3. Making the content accessible to non-experts
     4. Highlighting the significance and impact
     
-    Research paper text:
-    {chunk}
-    
     Remember to use web search for any technical terms, scientific concepts, or jargon 
     that would benefit from detailed explanation.
+    
+    Research paper text:
+    {compress_for_llm(chunk)}
     """
-    return call_openai_with_tools(prompt, use_web_search=True)
 
-def process_paper_enhanced(file_path):
+async def explain_paper_with_enhanced_tools(chunk):
     """
-    Enhanced workflow: Extract text, identify terms, explain with web search, find repositories with DeepWiki
+    Explain a research paper chunk using web search for technical terms.
+    Standalone helper: the pipeline gets its explanation from decode_chunk_combined instead.
     """
-    # Extract and chunk text
-    full_text = extract_text_from_pdf(file_path)
-    chunks = chunk_text(full_text)
+    return await call_openai_with_tools(paper_explanation_prompt(chunk), use_web_search=True)
+
+def combined_prompt(chunk):
+    """
+    Prompt asking for terms and repositories as a one-line JSON header, followed by a plain-text
+    explanation of the chunk.
+    The explanation comes last so that hitting the output limit can only cut the explanation short,
+    and so that a streamed reply has its terms ready before the explanation starts.
+    """
+    return f"""
+    Analyse this research paper text for a non-expert reader and complete all the tasks below.
+    You may use web search for technical terms and DeepWiki for GitHub repositories.
     
-    # Process first chunk for demonstration
-    chunk = chunks[0]
+    1. "terms": unique technical terms, concepts, and jargon a non-expert might not understand.
+       Group similar concepts together (e.g., "agentic systems", "agentic AI systems" -> "agentic systems").
+    2. "repos": relevant GitHub repositories (implementations, related research, tools and libraries,
+       datasets or benchmarks), each with a brief description of why it's relevant.
+    3. The explanation: a clear, accessible explanation of the text that summarizes the main points,
+       explains technical terms and highlights the significance and impact.
     
-    # Step 1: Identify technical terms
-    technical_terms = identify_technical_terms(chunk)
+    Lay out your answer exactly as follows:
+    - first, on a single line, a JSON object {{"terms": ["term1", "term2"], "repos": ["owner/name: why it's relevant"]}}
+    - then a line containing only {EXPLANATION_MARKER}
+    - then the explanation as plain text
     
-    # Step 2: Explain technical terms using web search
-    explanations = {}
-    for term in technical_terms[:5]:  # Limit to first 5 terms
-        explanation = explain_technical_term_with_web_search(term)
-        explanations[term] = explanation
+    Research paper text:
+    {compress_for_llm(chunk)}
+    """
+
+def parse_combined_response(response, include_explanation=True):
+    """
+    Parse a combined_prompt response into terms, repos and explanation.
+    Raises ValueError if the JSON header is malformed or the explanation is missing
+    (pass include_explanation=False to parse just the header of a reply still being streamed).
+    """
+    header, _, explanation = response.partition(EXPLANATION_MARKER)
+    # Tolerate a markdown code fence around the JSON header
+    header = re.sub(r"^```(?:json)?|```$", "", header.strip()).strip()
+    try:
+        result = json.loads(header)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Malformed JSON in combined response: {header[:200]!r}") from e
+    if not isinstance(result, dict) or not isinstance(result.get("terms"), list):
+        raise ValueError(f"Combined response has no \"terms\" list: {header[:200]!r}")
     
-    # Step 3: Find relevant repositories using DeepWiki
-    repositories = find_relevant_repositories(chunk)
+    explanation = explanation.strip()
+    if include_explanation and not explanation:
+        raise ValueError("Combined response is missing the explanation")
     
-    # Step 4: Create comprehensive explanation
-    comprehensive_explanation = explain_paper_with_enhanced_tools(chunk)
+    repos = result.get("repos")
+    if isinstance(repos, list):
+        repos = "\n".join(f"- {repo}" for repo in repos)
+    return {
+        "terms": clean_technical_terms(result["terms"]),
+        "repos": str(repos or "[No repositories returned]"),
+        "explanation": explanation,
+    }
+
+async def decode_chunk_combined(chunk):
+    """
+    Identify technical terms, find repositories and explain a chunk in a single request,
+    so the chunk is only sent (and billed as input) once.
+    Raises ValueError if the model's reply can't be parsed.
+    """
+    response = await call_openai_with_tools(
+        combined_prompt(chunk), use_deepwiki=True, use_web_search=True,
+        max_output_tokens=COMBINED_MAX_OUTPUT_TOKENS, validate=parse_combined_response
+    )
+    return parse_combined_response(response)
+
+async def process_chunk(chunk):
+    """Decode a single chunk: identify terms, explain them, find repositories and explain the text"""
+    # Steps 1, 3 and 4 in one request: identify terms, find repositories, explain the chunk
+    decoded = await decode_chunk_combined(chunk)
+    technical_terms = decoded["terms"]
+    
+    # Step 2: Explain technical terms in one batched request using web search
+    explanations = await explain_terms_batched(technical_terms[:5])  # Limit to first 5 terms
     
     return {
         "technical_terms": technical_terms,
         "explanations": explanations,
-        "repositories": repositories,
-        "comprehensive_explanation": comprehensive_explanation,
+        "repositories": decoded["repos"],
+        "comprehensive_explanation": decoded["explanation"],
         "chunk_processed": chunk[:200] + "..." if len(chunk) > 200 else chunk
     }
 
+async def _with_backoff(func, *args, max_attempts=CHUNK_MAX_ATTEMPTS, base_delay=CHUNK_RETRY_BASE_DELAY):
+    """Await func(*args), retrying malformed model output (ValueError) with jittered exponential backoff"""
+    for attempt in range(max_attempts):
+        try:
+            return await func(*args)
+        except ValueError as e:
+            if attempt == max_attempts - 1:
+                raise
+            delay = base_delay * 2 ** attempt + random.uniform(0, 1)
+            logger.debug('%s: %s; retrying in %.1fs', type(e).__name__, e, delay)
+            await asyncio.sleep(delay)
+
+async def process_paper_enhanced(file_path, concurrency=8):
+    """
+    Enhanced workflow: Extract text, identify terms, explain with web search, find repositories with DeepWiki.
+    Every chunk of the paper is processed concurrently, at most `concurrency` at a time.
+    Returns one result per chunk, in order; chunks that still fail after retries carry an "error" key.
+    """
+    # Extract and chunk text
+    full_text = extract_text_from_pdf(file_path)
+    chunks = chunk_text(full_text)
+    
+    sem = asyncio.Semaphore(concurrency)
+    
+    async def guarded(chunk):
+        async with sem:
+            return await _with_backoff(process_chunk, chunk)
+    
+    async with _openai_client():
+        outcomes = await asyncio.gather(*[guarded(chunk) for chunk in chunks], return_exceptions=True)
+    
+    results = []
+    for chunk, outcome in zip(chunks, outcomes):
+        # BaseException, since a cancelled chunk comes back as asyncio.CancelledError
+        if isinstance(outcome, BaseException):
+            outcome = {
+                "error": f"{type(outcome).__name__}: {outcome}",
+                "chunk_processed": chunk[:200] + "..." if len(chunk) > 200 else chunk
+            }
+        results.append(outcome)
+    return results
+
+async def submit_batch(prompts: List[Dict]) -> str:
+    """
+    Submit request parameters (as built by build_request_params) to the Batch API.
+    Returns the batch id; each request's custom_id is its index in prompts.
+    """
+    lines = [
+        json.dumps({"custom_id": str(i), "method": "POST", "url": BATCH_ENDPOINT, "body": params})
+        for i, params in enumerate(prompts)
+    ]
+    # Uploading and creating the batch are not idempotent: a retry after a timeout the server had
+    # already accepted would upload or start (and bill) a second job, so neither is retried
+    async with _openai_client() as client:
+        batch_file = await client.files.create(
+            file=("batch_input.jsonl", "\n".join(lines).encode("utf-8")),
+            purpose="batch"
+        )
+        batch = await client.batches.create(
+            input_file_id=batch_file.id,
+            endpoint=BATCH_ENDPOINT,
+            completion_window=BATCH_COMPLETION_WINDOW
+        )
+    logger.debug('Submitted batch %s with %d requests', batch.id, len(prompts))
+    return batch.id
+
+def _output_text_from_body(body):
+    """
+    Extract the model text from a raw Responses API body returned in a batch output file.
+    Joins every output_text part of the output messages, like response.output_text on the live path.
+    """
+    parts = [
+        content_item.get("text") or ""
+        for output_item in body.get("output") or []
+        if output_item.get("type") == "message"
+        for content_item in output_item.get("content") or []
+        if content_item.get("type") == "output_text"
+    ]
+    return "".join(parts) or "[No output from model]"
+
+async def wait_for_batch(batch_id, poll_interval=BATCH_POLL_INTERVAL):
+    """
+    Poll a batch until it finishes and return {custom_id: output text}.
+    Requests that failed inside a completed batch are missing from the result.
+    """
+    async with _openai_client() as client:
+        while True:
+            batch = await _retry_transient_errors(client.batches.retrieve)(batch_id)
+            if batch.status == "completed":
+                break
+            if batch.status in ("failed", "expired", "cancelled"):
+                raise RuntimeError(f"Batch {batch_id} ended with status '{batch.status}'")
+            logger.debug('Batch %s is %s, checking again in %ss', batch_id, batch.status, poll_interval)
+            await asyncio.sleep(poll_interval)
+        
+        content = None
+        if batch.output_file_id:
+            content = await _retry_transient_errors(client.files.content)(batch.output_file_id)
+    
+    results = {}
+    if content is not None:
+        for line in content.text.splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            response = record.get("response") or {}
+            if response.get("status_code") == 200:
+                results[record["custom_id"]] = _output_text_from_body(response.get("body") or {})
+    return results
+
+async def process_paper_batch(file_path):
+    """
+    Offline workflow: run every chunk of the paper through the Batch API.
+    Runs two batch jobs one after the other, so it can take up to 2 x BATCH_COMPLETION_WINDOW.
+    Returns one result per chunk, in the same format as process_paper_enhanced.
+    """
+    async with _openai_client():
+        return await _run_paper_batch(file_path)
+
+async def _run_paper_batch(file_path):
+    full_text = extract_text_from_pdf(file_path)
+    chunks = chunk_text(full_text)
+    
+    # Round 1: terms, repositories and explanation for every chunk
+    batch_id = await submit_batch([
+        build_request_params(combined_prompt(chunk), use_deepwiki=True, use_web_search=True,
+                             max_output_tokens=COMBINED_MAX_OUTPUT_TOKENS)
+        for chunk in chunks
+    ])
+    outputs = await wait_for_batch(batch_id)
+    decoded_chunks = []
+    for i in range(len(chunks)):
+        try:
+            decoded_chunks.append(parse_combined_response(outputs.get(str(i), "")))
+        except ValueError as e:
+            decoded_chunks.append(e)
+    
+    # Round 2: one batched explanation request per chunk that has terms
+    term_lists = [decoded["terms"][:5] if isinstance(decoded, dict) else [] for decoded in decoded_chunks]
+    explanations = [{} for _ in chunks]
+    pending = [i for i, terms in enumerate(term_lists) if terms]
+    if pending:
+        batch_id = await submit_batch([
+            build_request_params(batched_terms_prompt(term_lists[i]), use_web_search=True, text_format="json_object")
+            for i in pending
+        ])
+        outputs = await wait_for_batch(batch_id)
+        for n, i in enumerate(pending):
+            explanations[i] = parse_batched_terms_response(term_lists[i], outputs.get(str(n), ""))
+    
+    results = []
+    for chunk, decoded, chunk_explanations in zip(chunks, decoded_chunks, explanations):
+        chunk_processed = chunk[:200] + "..." if len(chunk) > 200 else chunk
+        if isinstance(decoded, ValueError):
+            results.append({"error": f"ValueError: {decoded}", "chunk_processed": chunk_processed})
+            continue
+        results.append({
+            "technical_terms": decoded["terms"],
+            "explanations": chunk_explanations,
+            "repositories": decoded["repos"],
+            "comprehensive_explanation": decoded["explanation"],
+            "chunk_processed": chunk_processed
+        })
+    return results
+
+def _format_terms(terms):
+    lines = [f"\n📄 Technical Terms Found ({len(terms)}):"]
+    lines += [f"   {i}. {term}" for i, term in enumerate(terms, 1)]
+    return "\n".join(lines) + "\n"
+
+def _format_term_explanations(explanations):
+    lines = ["\n🔍 Technical Term Explanations:"]
+    for term, explanation in explanations.items():
+        lines += [f"\n   **{term}**:", f"   {explanation}"]
+    return "\n".join(lines) + "\n"
+
+def _format_repositories(repositories):
+    return f"\n📚 Relevant Repositories:\n{repositories}\n"
+
+def _format_error(error):
+    return f"\n⚠️ Failed to process chunk: {error}\n"
+
+def print_result(result):
+    """Pretty-print a single chunk result"""
+    if "error" in result:
+        print(_format_error(result["error"]), end="")
+        return
+    
+    print(_format_terms(result['technical_terms']), end="")
+    print(_format_term_explanations(result['explanations']), end="")
+    print(_format_repositories(result['repositories']), end="")
+    print(f"\n📖 Comprehensive Explanation:")
+    print(result['comprehensive_explanation'])
+
+async def _decode_chunk_streaming(chunk, emit):
+    """
+    Decode a chunk with the same single combined request as process_chunk, but stream it:
+    terms and repositories are emitted as soon as the JSON header arrives, the explanation
+    as it is generated, and the term explanations (requested in parallel) once it ends.
+    Raises ValueError only before anything has been emitted, so the call can be retried.
+    """
+    deltas = call_openai_with_tools_streaming(
+        combined_prompt(chunk), use_deepwiki=True, use_web_search=True,
+        max_output_tokens=COMBINED_MAX_OUTPUT_TOKENS, validate=parse_combined_response
+    )
+    text = ""
+    term_task = None
+    try:
+        async for delta in deltas:
+            if term_task is not None:
+                emit(delta)
+                continue
+            text += delta
+            if EXPLANATION_MARKER not in text:
+                continue
+            header, _, explanation = text.partition(EXPLANATION_MARKER)
+            decoded = parse_combined_response(header, include_explanation=False)
+            term_task = asyncio.create_task(explain_terms_batched(decoded["terms"][:5]))  # Limit to first 5 terms
+            emit(_format_terms(decoded["terms"]))
+            emit(_format_repositories(decoded["repos"]))
+            emit("\n📖 Comprehensive Explanation:\n")
+            emit(explanation.lstrip())
+        if term_task is None:
+            # The stream ended without an explanation marker: raise the matching ValueError
+            parse_combined_response(text)
+        emit("\n")
+        
+        try:
+            explanations = await term_task
+        except Exception as e:
+            # Output has already started, so report the failure instead of raising for a retry
+            emit(f"\n⚠️ Failed to explain technical terms: {type(e).__name__}: {e}\n")
+        else:
+            emit(_format_term_explanations(explanations))
+    finally:
+        if term_task is not None and not term_task.done():
+            term_task.cancel()
+
+async def _stream_chunk_to_queue(chunk, queue, sem):
+    """Stream one chunk's output into its queue, ending it with None whether or not the chunk fails"""
+    try:
+        async with sem:
+            await _with_backoff(_decode_chunk_streaming, chunk, queue.put_nowait)
+    except Exception as e:
+        queue.put_nowait(_format_error(f"{type(e).__name__}: {e}"))
+    finally:
+        queue.put_nowait(None)
+
+async def _decode_and_stream(file_path, concurrency=8):
+    """
+    Decode every chunk concurrently (at most `concurrency` at a time) and print the output in
+    chunk order: the first chunk streams live while later chunks are buffered until their turn.
+    """
+    async with _openai_client():
+        await _stream_chunks(chunk_text(extract_text_from_pdf(file_path)), concurrency)
+
+async def _stream_chunks(chunks, concurrency):
+    sem = asyncio.Semaphore(concurrency)
+    queues = [asyncio.Queue() for _ in chunks]
+    # Tasks copy the current context, so each one sees the client opened by _decode_and_stream
+    tasks = [asyncio.create_task(_stream_chunk_to_queue(chunk, queue, sem)) for chunk, queue in zip(chunks, queues)]
+    
+    print("\n" + "="*50)
+    print("ENHANCED PAPER DECODER RESULTS")
+    print("="*50)
+    
+    try:
+        for i, queue in enumerate(queues, 1):
+            if len(chunks) > 1:
+                print(f"\n----- Chunk {i}/{len(chunks)} -----")
+            while True:
+                text = await queue.get()
+                if text is None:
+                    break
+                print(text, end="", flush=True)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+def _run_async(coro):
+    """Run a coroutine on uvloop's faster event loop when it is installed (POSIX only)"""
+    if os.name == "posix":
+        try:
+            import uvloop
+        except ImportError:
+            pass
+        else:
+            # uvloop.run creates its loop through a loop factory; no global event loop policy is set
+            return uvloop.run(coro)
+    return asyncio.run(coro)
+
 def main():
     """Main function to run the enhanced paper decoder"""
-    file_path = "SLMs.pdf"
+    parser = argparse.ArgumentParser(description="Decode a research paper PDF")
+    parser.add_argument("file_path", nargs="?", default="SLMs.pdf", help="PDF to process")
+    parser.add_argument("--batch", action="store_true",
+                        help="process every chunk through the OpenAI Batch API (50%% cheaper, up to 48h)")
+    args = parser.parse_args()
+    
+    # Show this module's debug messages on stderr without turning on the HTTP libraries' own logging
+    logging.basicConfig(format="%(levelname)s: %(message)s")
+    logger.setLevel(logging.DEBUG)
     
     try:
-        result = process_paper_enhanced(file_path)
+        if not args.batch:
+            _run_async(_decode_and_stream(args.file_path))
+            return
+        
+        results = _run_async(process_paper_batch(args.file_path))
         
         print("\n" + "="*50)
         print("ENHANCED PAPER DECODER RESULTS")
         print("="*50)
         
-        print(f"\n📄 Technical Terms Found ({len(result['technical_terms'])}):")
-        for i, term in enumerate(result['technical_terms'], 1):
-            print(f"   {i}. {term}")
-        
-        print(f"\n🔍 Technical Term Explanations:")
-        for term, explanation in result['explanations'].items():
-            print(f"\n   **{term}**:")
-            print(f"   {explanation}")
-        
-        print(f"\n📚 Relevant Repositories:")
-        print(result['repositories'])
-        
-        print(f"\n📖 Comprehensive Explanation:")
-        print(result['comprehensive_explanation'])
+        for i, result in enumerate(results, 1):
+            if len(results) > 1:
+                print(f"\n----- Chunk {i}/{len(results)} -----")
+            print_result(result)
         
     except Exception as e:
         print(f"Error processing paper: {str(e)}")